@@ -5,7 +5,6 @@ This module is the running module.
 """
 
 import argparse
-from datetime import datetime
 import os
 import sys
 import transaction_handling
@@ -20,6 +19,10 @@ OTHER_ID_POSITION = 15
 OUTPUT_FILE_NAME_BY_DATE = 'medianvals_by_date.txt'
 OUTPUT_FILE_NAME_BY_ZIPCODE = 'medianvals_by_zip.txt'
 
+# All valid 'MMDD' prefixes of a TRANSACTION_DT, including '0229' which is checked against the year separately.
+DAYS_IN_MONTH = (31, 29, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31)
+VALID_MONTH_DAYS = frozenset(('%02d%02d' % (month, day)).encode('ascii') for month, days in enumerate(DAYS_IN_MONTH, 1) for day in range(1, days + 1))
+
 def get_args():
     """ Parse user auguments from command line. """
 
@@ -33,66 +36,84 @@ def get_args():
     return args
 
 def is_valid_date(date_str):
-    """ Check whether a string is in valid date format.  """
+    """ Check whether a byte string is a valid date in 'MMDDYYYY' format.  """
 
-    try:
-        datetime.strptime(date_str, '%m%d%Y')
-        return True
-    except:
+    if len(date_str) != 8 or date_str[0:4] not in VALID_MONTH_DAYS:
         return False
-
-def is_number(s):
-    """ Check whether a string is a number. """
-    try:
-        float(s) # for int, long and float
-    except ValueError:
+    year_str = date_str[4:8]
+    # The year must consist of ASCII digits only and can NOT be 0000.
+    if year_str.strip(b'0123456789') or year_str == b'0000':
         return False
+    if date_str[0:4] == b'0229':
+        year = int(year_str)
+        return year % 4 == 0 and (year % 100 != 0 or year % 400 == 0)
     return True
 
-def read_file(input_file_path, transac_by_date_thread, transac_by_zip_thread):
-    """ Read input file and feed data items into the task queue of transaction handling threads.  """
-    input_file = open(input_file_path, 'r')
+def read_file(input_file_path, transac_by_date_processor, transac_by_zip_processor):
+    """ Read input file and feed data items into the transaction processors.
+
+    The input file is read in binary mode, because it is plain ASCII and decoding every line is pure overhead.
+    So all columns are handed to the processors as byte strings.
+    """
+    # Byte strings can NOT be interned by sys.intern, so equal CMTE_IDs and TRANSACTION_DTs are collapsed through this dict instead.
+    interned_columns = {}
+    # TRANSACTION_AMT values repeat heavily, so each distinct column value is parsed once and its float object
+    # is shared by all the records, rather than every record keeping its own boxed float in the heaps.
+    parsed_amounts = {}
+    input_file = open(input_file_path, 'rb')
     for line in input_file:
-        line_items = line.split('|')
+        # Only split as far as the last column in use, so that the trailing columns are not materialized one by one.
+        line_items = line.split(b'|', OTHER_ID_POSITION + 1)
 
         # If the OTHER_ID column is NOT empty, ignore entire record.
         if line_items[OTHER_ID_POSITION]:
             continue
 
-        # If the CMTE_ID or TRANSACTION_AMT column is empty or TRANSACTION_AMT column is not a valid number, ignore entire record.
-        if not line_items[CMTE_ID_POSITION] or not line_items[TRANSACTION_AMT_POSITION] or not is_number(line_items[TRANSACTION_AMT_POSITION]):
+        # If the CMTE_ID column is empty, ignore entire record.
+        if not line_items[CMTE_ID_POSITION]:
             continue
 
-        distilled_data = {"cmte_id" : line_items[CMTE_ID_POSITION],
-                          "zipcode" : line_items[ZIPCODE_POSITION],
-                          "transaction_dt" : line_items[TRANSACTION_DT_POSITION],
-                          "transaction_amt" : float(line_items[TRANSACTION_AMT_POSITION])}
+        # If the TRANSACTION_AMT column is empty or is not a valid number, ignore entire record.
+        # The amount is parsed only once, and the parsed value is reused below.
+        raw_transaction_amt = line_items[TRANSACTION_AMT_POSITION]
+        transaction_amt = parsed_amounts.get(raw_transaction_amt)
+        if transaction_amt is None:
+            try:
+                transaction_amt = float(raw_transaction_amt)
+            except ValueError:
+                continue
+            parsed_amounts[raw_transaction_amt] = transaction_amt
+
+        # The fields are handed to the processors as plain arguments, so no container is allocated per record.
+        # CMTE_ID is interned so that records of the same committee share one object with a cached hash.
+        cmte_id = line_items[CMTE_ID_POSITION]
+        cmte_id = interned_columns.setdefault(cmte_id, cmte_id)
+        zipcode = line_items[ZIPCODE_POSITION]
+        transaction_dt = line_items[TRANSACTION_DT_POSITION]
 
         # If the TRANSACTION_DT colomn is well-formed......
-        if distilled_data["transaction_dt"] and is_valid_date(distilled_data["transaction_dt"]):
-            transac_by_date_thread.add_task(distilled_data)
+        if transaction_dt and is_valid_date(transaction_dt):
+            # TRANSACTION_DT is interned as well, so the (CMTE_ID, TRANSACTION_DT) identifiers are built from shared objects.
+            transaction_dt = interned_columns.setdefault(transaction_dt, transaction_dt)
+            transac_by_date_processor.handler(cmte_id, zipcode, transaction_dt, transaction_amt)
         # If the ZIPCODE column is well-formed......
-        if len(distilled_data["zipcode"]) >= 5:
-            distilled_data["zipcode"] = distilled_data["zipcode"][0:5]
-            transac_by_zip_thread.add_task(distilled_data)
-    end_data = {"cmte_id": '', "zipcode": '', "transaction_dt": '', "transaction_amt": 0}
-    transac_by_date_thread.add_task(end_data)
-    transac_by_zip_thread.add_task(end_data)
+        if len(zipcode) >= 5:
+            transac_by_zip_processor.handler(cmte_id, zipcode[0:5], transaction_dt, transaction_amt)
     input_file.close()
 
 if __name__ == '__main__':
     try:
         usr_args = get_args()
         if os.path.isfile(usr_args.input_file_path) and os.path.isdir(usr_args.output_dir):
-            # Create 2 transaction handling threads, one for dealing by data, the other for dealing by zipcode.
-            thread_transac_by_date = transaction_handling.TransactionByDateThread(output_file_path = os.path.join(usr_args.output_dir, OUTPUT_FILE_NAME_BY_DATE))
-            thread_transac_by_zip = transaction_handling.TransactionByZipThread(output_file_path = os.path.join(usr_args.output_dir, OUTPUT_FILE_NAME_BY_ZIPCODE))
+            # Create 2 transaction processors, one for dealing by date, the other for dealing by zipcode.
+            transac_by_date_processor = transaction_handling.TransactionByDateProcessor(output_file_path = os.path.join(usr_args.output_dir, OUTPUT_FILE_NAME_BY_DATE))
+            transac_by_zip_processor = transaction_handling.TransactionByZipProcessor(output_file_path = os.path.join(usr_args.output_dir, OUTPUT_FILE_NAME_BY_ZIPCODE))
 
-            read_file(usr_args.input_file_path, thread_transac_by_date, thread_transac_by_zip)
+            read_file(usr_args.input_file_path, transac_by_date_processor, transac_by_zip_processor)
 
-            # Wait for working threads
-            thread_transac_by_date.wait_complete()
-            thread_transac_by_zip.wait_complete()
+            # All data has been handled, write the remaining output.
+            transac_by_date_processor.finalize()
+            transac_by_zip_processor.finalize()
         else:
             print ("The input file or ouput directory does NOT exist.\n")
     except:
@@ -1,7 +1,7 @@
 """ This module contains logics dealing with transactions by date.
 
-In more detail, this module will maintain a thread, and use this thread to handle the data inserted
-into the task queue.
+In more detail, this module provides transaction processors, to which the main module feeds
+the input data directly, record by record.
 Besides, required data structures are maintained as member variables.
 
 The Algorithm to Get Running Median:
@@ -14,180 +14,196 @@ The Algorithm to Get Running Median:
        Check whether these 2 heaps are in the equal size:
            If Yes, return  (max value in the lower part + min value in the higher part) / 2.0
            If No, return (root value in the heap which has more value.)
+  Most 'CMTE_ID|ZIPCODE' identifiers only have a few transactions, and for them a plain sorted list is faster:
+  the amount is inserted by bisect and the median is read by index. So each identifier starts with a sorted list,
+  which is split into the 2 heaps above once it holds more than SORTED_AMOUNTS_MAX_SIZE amounts, because inserting
+  into a long list moves too many items.
+
+The Algorithm to Get Median by Date:
+  The median by date is only needed at the end, so "Balanced Heaps" are not needed there.
+  1) Collect the transaction amounts of each identifier into a list.
+  2) At the end, sort each list once and return the average value of its middle item(s).
 """
 
-import heap
-import sys
-from threading import Thread
+from bisect import insort
+from collections import defaultdict
+import heapq
 
-if sys.version_info[0] == 2:
-    from Queue import Queue
-else:
-    from queue import Queue
+# The size of the buffer of output file, in bytes.
+OUTPUT_FILE_BUFFER_SIZE = 1 << 20
+# The number of output lines which are accumulated before being written to the output file at once.
+OUTPUT_LINES_PER_WRITE = 8192
+# The max number of amounts of one identifier kept in a sorted list by TransactionByZipProcessor, before switching to heaps.
+SORTED_AMOUNTS_MAX_SIZE = 1000
 
-class TransactionThread(Thread):
-    """ This class derives from threading.Thread class and is responsible for dealing with input data by transaction date.
+class TransactionProcessor(object):
+    """ This class is the base class of transaction processors.
 
-    The thread will store input data and calculate median at the end. Finaly, it will write the output file 'medianvals_by_date.txt'.
+    The processor will store input data and calculate median. Finaly, it will write the output file 'medianvals_by_[date|zip].txt'.
+    The input data is handled in the caller`s thread, because the work is CPU-bound and a worker thread brings no parallelism under the GIL.
 
     Attributes:
-      task_queue: The queue of input data. Main thread feeds data into this queue and this thread consumes these data.
-      total_amt_dict: The total amount of transactions which is identified by 'CMTE_ID|TRANSACTION_DT'
-      transactions_dict: The list of transaction amounts which is identified by 'CMTE_ID|TRANSACTION_DT'.
-                         This list should be sorted so that I can extract the median at the end.
+      transaction_records: The state of transactions which is identified by a (CMTE_ID, TRANSACTION_DT) or (CMTE_ID, ZIPCODE) tuple.
+                           Each record is a list which starts with the total amount, so that one lookup gives
+                           both the total amount and the transaction amounts needed for the median.
     """
-    def __init__(self, output_file_path):
-        """ Constructor of transaction handler thread.
+    def __init__(self, output_file_path, new_record):
+        """ Constructor of transaction processor.
         Args:
           output_file_path: The path of output file. According to Challenge Instructions, it should be 'project_path/output/medianvals_by_[data|zip].txt'.
+          new_record: The function which returns the initial record of an identifier seen for the first time.
         """
-        Thread.__init__(self)
-        self.task_queue = Queue()
-        self.total_amt_dict = {}
-        self.transaction_amt_heaps = {}
-        self.output_file = open(output_file_path, 'w')
-        self.daemon = True
-        self.start()
-
-    def add_task(self, item):
-        self.task_queue.put(item)
+        self.transaction_records = defaultdict(new_record)
+        self.output_file = open(output_file_path, 'wb', OUTPUT_FILE_BUFFER_SIZE)
 
-    def wait_complete(self):
-        self.task_queue.join()
+    def transaction_heaps_insert(self, lower_heap, higher_heap, number):
+        """ Insert a number into one pair of "Balanced Heaps" and keep them balanced.
 
-    def transaction_heaps_add_number(self, identifier, number):
-        """ Add a number to one of "Balanced Heaps"(self.transaction_amt_heaps) which is identified by the identifier.
+        Both heaps are plain lists manipulated by heapq and lower_heap stores negated numbers to act as a Max Heap.
+        The logic to insert a number is:
+          1) If lower_heap is empty or number < -lower_heap[0], the number belongs to the lower part;
+             Otherwise, it belongs to the higher part.
+          2) If the heap of that part already has more items than the other heap, push the number into it and
+             move its root to the other heap in one step, so that the difference of size is up to 1.
+             Otherwise, just push the number into it.
 
-        Due to the transaction_amt_heaps is constructed in format '{"identifier": (lower_heap, higher_heap)}',
-        the logic to add a number is:
-          1) If lower_heap is empty or number < lower_heap.peek(), add number to the lower_heap;
-          2) Otherwise, add number to the higher_heap.
+        Args:
+          lower_heap: The lower heap of the record into which the number is inserted.
+          higher_heap: The higher heap of the same record.
+          number: (float) The number to be inserted.
+        """
+        if not lower_heap or number < -lower_heap[0]:
+            if len(lower_heap) > len(higher_heap):
+                heapq.heappush(higher_heap, -heapq.heappushpop(lower_heap, -number))
+            else:
+                heapq.heappush(lower_heap, -number)
+        else:
+            if len(higher_heap) > len(lower_heap):
+                heapq.heappush(lower_heap, -heapq.heappushpop(higher_heap, number))
+            else:
+                heapq.heappush(higher_heap, number)
 
+    def transaction_heaps_get_median(self, lower_heap, higher_heap):
+        """ Get the median of transaction amount stored in one pair of "Balanced Heaps".
         Args:
-          identifier: Identify the transaction_amt_heaps to which the number is added. The format should be 'CMTE_ID|TRANSACTION_DT' or 'CMTE_ID|ZIPCODE'.
-          number: (float) The number to be added.
+          lower_heap: The lower heap from which the median is got.
+          higher_heap: The higher heap from which the median is got.
         """
-        if identifier not in self.transaction_amt_heaps:
-            self.transaction_amt_heaps[identifier] = (heap.MaxHeap(), heap.MinHeap())
-        # If lower_heap is empty or the number to be added is less than lower_heap.peek(), add the number to lower_heap.
-        if self.transaction_amt_heaps[identifier][0].empty() or number < self.transaction_amt_heaps[identifier][0].peek():
-            self.transaction_amt_heaps[identifier][0].push(number)
-        # Otherwise, add the number to higher_heap.
+        # If the size of 2 heap is equal, return the average value of "the max value of lower heap and the min value of higher heap".
+        if len(lower_heap) == len(higher_heap):
+            return int(round((-lower_heap[0] + higher_heap[0])/2.0))
+        # Otherwise, return the root value of the heap which has more values.
+        elif len(lower_heap) > len(higher_heap):
+            return int(round(-lower_heap[0]))
         else:
-            self.transaction_amt_heaps[identifier][1].push(number)
+            return int(round(higher_heap[0]))
 
-    def transaction_heaps_rebalance(self, identifier):
-        """ Rebalance the transaction_amt_heaps which is identified by identifier.
-        The goal is to make sure the difference of size of lower_heap and higher_heap is up to 1.
+    def handler(self, cmte_id, zipcode, transaction_dt, transaction_amt):
+        pass
+
+    def finalize(self):
+        """ Called once after all input data has been handled. Close the output file.  """
+        self.output_file.close()
+
+class TransactionByDateProcessor(TransactionProcessor):
+    """ The processor handles transaction by date.
+
+    Each record in transaction_records is a list '[total_amount, amounts]',
+    where amounts is the list of transaction amounts in input order.
+    """
+    def __init__(self, output_file_path):
+        TransactionProcessor.__init__(self, output_file_path, lambda: [0, []])
+
+    def transaction_amounts_get_median(self, amounts):
+        """ Get the median of transaction amount by sorting the amounts in place.
         Args:
-          identifier: Identify whose lower_heap and higher_heap need to be rebalanced. The format should be 'CMTE_ID|TRANSACTION_DT' or 'CMTE_ID|ZIPCODE'.
+          amounts: The list of transaction amounts of one identifier.
         """
-        try:
-            # First, find the heap whose size is larger, and whose is smaller.
-            if self.transaction_amt_heaps[identifier][0].size() > self.transaction_amt_heaps[identifier][1].size():
-                bigger_heap = self.transaction_amt_heaps[identifier][0]
-                smaller_heap = self.transaction_amt_heaps[identifier][1]
-            else:
-                bigger_heap = self.transaction_amt_heaps[identifier][1]
-                smaller_heap = self.transaction_amt_heaps[identifier][0]
-            # only when the difference of size is larger than 1, rebalancing is needed.
-            if bigger_heap.size() - smaller_heap.size() >= 2:
-                smaller_heap.push(bigger_heap.pop())
-        except IndexError:
-            print ("Error happened when rebalanced the non-exist heaps of 'CMTE_ID|TRANSACTION_DT' or 'CMTE_ID|ZIPCODE'.")
-            return
-
-    def transaction_heaps_get_median(self, identifier):
-        """ Get the median of transaction amount which is indentified by indentifier.
+        amounts.sort()
+        number_of_transactions = len(amounts)
+        # For odd number of transactions, these 2 positions are the same.
+        return int(round((amounts[(number_of_transactions - 1) // 2] + amounts[number_of_transactions // 2])/2.0))
+
+    def handler(self, cmte_id, zipcode, transaction_dt, transaction_amt):
+        """ Store input data and collect transaction amount according to the algorithm shown above.
         Args:
-          identifier: Identify the transaction heaps from which the median is got. The format shoud be 'CMTE_ID|TRANSACTION_DT' or 'CMTE_ID|ZIPCODE'.
+          cmte_id: (bytes) The CMTE_ID column of the record.
+          zipcode: (bytes) The raw ZIPCODE column, which may be empty or malformed. Not used by this processor.
+          transaction_dt: (bytes) The TRANSACTION_DT column, in 'MMDDYYYY' format.
+          transaction_amt: (float) The TRANSACTION_AMT column.
         """
-        try:
-            # First, find the heap whose size is larger, and whose is smaller.
-            if self.transaction_amt_heaps[identifier][0].size() > self.transaction_amt_heaps[identifier][1].size():
-                bigger_heap = self.transaction_amt_heaps[identifier][0]
-                smaller_heap = self.transaction_amt_heaps[identifier][1]
-            else:
-                bigger_heap = self.transaction_amt_heaps[identifier][1]
-                smaller_heap = self.transaction_amt_heaps[identifier][0]
-            # Then, find the median.
-            # If the size of 2 heap is equal, return the average value of "the max value of min heap and the min value of max heap".
-            if bigger_heap.size() == smaller_heap.size():
-                return int(round((bigger_heap.peek() + smaller_heap.peek())/2.0))
-            else:
-                return int(round(bigger_heap.peek()))
-        except IndexError:
-            print ("Error happened when got median from the non-exist heaps of 'CMTE_ID|TRANSACTION_DT' or 'CMTE_ID|ZIPCODE'.")
-            return
+        # Store valid data and collect transaction amount.
+        record = self.transaction_records[(cmte_id, transaction_dt)]
+        record[0] += transaction_amt
+        record[1].append(transaction_amt)
 
-    def handler(self, data):
-        pass
+    def finalize(self):
+        """ All data has been handled. Get median for each CMTE_ID and TRANSACTION_DT pair and write the output file.  """
+        # Format all output lines first and write them to the output file at once.
+        get_median = self.transaction_amounts_get_median
+        self.output_file.write(b''.join([b'%s|%s|%d|%d|%d\n' % (cmte_id, transaction_dt, get_median(amounts), len(amounts), total_amount)
+                                         for (cmte_id, transaction_dt), (total_amount, amounts) in self.transaction_records.items()]))
+        TransactionProcessor.finalize(self)
 
-    def run(self):
-        while(True):
-            data = self.task_queue.get()
-            self.handler(data)
-            self.task_queue.task_done()
 
-class TransactionByDateThread(TransactionThread):
-    """ The thread handles transaction by date.  """
+class TransactionByZipProcessor(TransactionProcessor):
+    """ The processor handles transaction by zipcode.
+
+    Each record in transaction_records is a list '[total_amount, sorted_amounts, None]' at first, and becomes
+    '[total_amount, lower_heap, higher_heap]' once it holds more than SORTED_AMOUNTS_MAX_SIZE amounts.
+
+    One output line is produced per input record, so the lines are accumulated in output_lines
+    and written to the output file OUTPUT_LINES_PER_WRITE lines at a time.
+    """
     def __init__(self, output_file_path):
-        TransactionThread.__init__(self, output_file_path)
+        TransactionProcessor.__init__(self, output_file_path, lambda: [0, [], None])
+        self.output_lines = []
 
-    def handler(self, data):
-        """ Store input data and store transaction amount into 2 heaps according to the algorithm shown above.
+    def sorted_amounts_to_heaps(self, sorted_amounts):
+        """ Split a sorted list of amounts into a pair of "Balanced Heaps".
+        The lower half reversed and negated, and the higher half, are both in ascending order, so they are valid heaps already.
         Args:
-          data: input data. Format: {"cmte_id" : string,
-                                     "zipcode" : string,
-                                     "transaction_dt" : 'MMDDYYYY'],
-                                     "transaction_amt" : float}
+          sorted_amounts: The amounts of one identifier, in ascending order.
+        Returns:
+          The (lower_heap, higher_heap) tuple.
         """
-        # If data["cmte_id"] is empty, it indicates that all data has been inserted.
-        # So, it is time to get median for each CMTE_ID and TRANSACTION_DT pair and write the output file.
-        if not data["cmte_id"]:
-            for identifier in self.transaction_amt_heaps:
-                number_of_transactions = self.transaction_amt_heaps[identifier][0].size() + self.transaction_amt_heaps[identifier][1].size()
-                median = self.transaction_heaps_get_median(identifier)
-                total_transaction_amount = int(self.total_amt_dict[identifier])
-                cmte_id = identifier.split('|')[0]
-                transaction_dt = identifier.split('|')[1]
-                self.output_file.write('%s|%s|%d|%d|%d\n' % (cmte_id, transaction_dt, median, number_of_transactions, total_transaction_amount))
-            self.output_file.close()
-            return
-        # For valid data, store them and store transaction amount into "Balanced Heaps".
-        identifier = '%s|%s' % (data["cmte_id"], data["transaction_dt"])
-        if identifier not in self.total_amt_dict:
-            self.total_amt_dict[identifier] = 0
-        self.total_amt_dict[identifier] += data["transaction_amt"]
-        self.transaction_heaps_add_number(identifier, data["transaction_amt"])
-        self.transaction_heaps_rebalance(identifier)
-
-
-class TransactionByZipThread(TransactionThread):
-    """ The thread handles transaction by data.  """
-    def __init__(self, output_file_path):
-        TransactionThread.__init__(self, output_file_path)
+        middle = len(sorted_amounts) // 2
+        return [-amount for amount in reversed(sorted_amounts[:middle])], sorted_amounts[middle:]
 
-    def handler(self, data):
+    def handler(self, cmte_id, zipcode, transaction_dt, transaction_amt):
         """ Store input data and store transaction amount into 2 heaps according to the algorithm shown above.
         Args:
-          data: input data. Format: {"cmte_id" : string,
-                                     "zipcode" : string,
-                                     "transaction_dt" : 'MMDDYYYY'],
-                                     "transaction_amt" : float}
+          cmte_id: (bytes) The CMTE_ID column of the record.
+          zipcode: (bytes) The first 5 characters of the ZIPCODE column.
+          transaction_dt: (bytes) The TRANSACTION_DT column, in 'MMDDYYYY' format.
+          transaction_amt: (float) The TRANSACTION_AMT column.
         """
-        # If data["cmte_id"] is empty, it represents the end of data stream.
-        if not data["cmte_id"]:
-            self.output_file.close()
-            return
-        # If it`s not end, get runnning median and write output file.
-        identifier = '%s|%s' % (data["cmte_id"], data["zipcode"])
-        if identifier not in self.total_amt_dict:
-            self.total_amt_dict[identifier] = 0
-        self.total_amt_dict[identifier] += data["transaction_amt"]
-        self.transaction_heaps_add_number(identifier, data["transaction_amt"])
-        self.transaction_heaps_rebalance(identifier)
-        number_of_transactions = self.transaction_amt_heaps[identifier][0].size() + self.transaction_amt_heaps[identifier][1].size()
-        running_median = self.transaction_heaps_get_median(identifier)
-        total_transaction_amount = int(self.total_amt_dict[identifier])
-        self.output_file.write('%s|%s|%d|%d|%d\n' % (data["cmte_id"], data["zipcode"], running_median, number_of_transactions, total_transaction_amount))
+        # Get runnning median and write output file.
+        record = self.transaction_records[(cmte_id, zipcode)]
+        record[0] += transaction_amt
+        lower_heap = record[1]
+        higher_heap = record[2]
+        if higher_heap is None:
+            # The identifier still keeps its amounts in a sorted list.
+            sorted_amounts = record[1]
+            insort(sorted_amounts, transaction_amt)
+            number_of_transactions = len(sorted_amounts)
+            running_median = int(round((sorted_amounts[(number_of_transactions - 1) // 2] + sorted_amounts[number_of_transactions // 2])/2.0))
+            if number_of_transactions > SORTED_AMOUNTS_MAX_SIZE:
+                record[1], record[2] = self.sorted_amounts_to_heaps(sorted_amounts)
+        else:
+            self.transaction_heaps_insert(lower_heap, higher_heap, transaction_amt)
+            number_of_transactions = len(lower_heap) + len(higher_heap)
+            running_median = self.transaction_heaps_get_median(lower_heap, higher_heap)
+        output_lines = self.output_lines
+        # '%d' truncates a float exactly as int() does, so the float amounts are formatted without converting them first.
+        output_lines.append(b'%s|%s|%d|%d|%d\n' % (cmte_id, zipcode, running_median, number_of_transactions, record[0]))
+        if len(output_lines) >= OUTPUT_LINES_PER_WRITE:
+            self.output_file.write(b''.join(output_lines))
+            del output_lines[:]
+
+    def finalize(self):
+        """ All data has been handled. Write the remaining output lines and close the output file.  """
+        self.output_file.write(b''.join(self.output_lines))
+        del self.output_lines[:]
+        TransactionProcessor.finalize(self)